@@ -6,25 +6,30 @@ import csv
 import io
 import hashlib
 import zipfile
+from collections import defaultdict
+from functools import lru_cache
 from html import escape
 from pathlib import Path
+from typing import IO, Callable, Mapping, TypeVar
 
 import streamlit as st
 from PIL import Image, ImageDraw, ImageFont
 
 from scheduler import data_loader
 from scheduler.data_loader import DataLoaderError
-from scheduler.models import Adult, Student, Timeslot
-from scheduler.scheduling import Schedule
+from scheduler.models import TIMESLOTS, Adult, Student, Timeslot, Workshop
+from scheduler.scheduling import Assignment, Schedule
 
 DATA_DIR = Path(__file__).parent / "data"
-DEFAULT_TIMESLOTS: list[Timeslot] = [
-    "8:45-9:30",
-    "9:30-10:15",
-    "10:15-11:00",
-    "11:30-12:15",
-    "12:15-13:00",
-]
+STYLESHEET_PATH = Path(__file__).parent / "static" / "app.css"
+DEFAULT_TIMESLOTS: tuple[Timeslot, ...] = TIMESLOTS
+DEFAULT_TIMESLOT_SET: frozenset[Timeslot] = frozenset(DEFAULT_TIMESLOTS)
+
+T = TypeVar("T")
+
+# st.fragment only exists in recent Streamlit releases (experimental_fragment
+# before that); older versions fall back to rerunning the whole script.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
 STAGE_CLASS_MAP: dict[str, str] = {
     "mitjans": "stage-mitjans",
@@ -39,104 +44,178 @@ def safe_filename(name: str) -> str:
 
 
 def build_table_html(rows: list[dict[str, str]], columns: list[str]) -> str:
-    if not rows:
-        header_html = "".join(f"<th>{column}</th>" for column in columns)
-        return f"<table class='horaris-table'><thead><tr>{header_html}</tr></thead><tbody></tbody></table>"
-
-    header_html = "".join(f"<th>{column}</th>" for column in columns)
-    body_rows = []
+    esc = escape
+    parts = ["<table class='horaris-table'><thead><tr>"]
+    parts.extend(f"<th>{column}</th>" for column in columns)
+    parts.append("</tr></thead><tbody>")
     for row in rows:
-        cells = [row.get(column, "") for column in columns]
-        cell_html = "".join(f"<td>{escape(str(value))}</td>" for value in cells)
-        body_rows.append(f"<tr>{cell_html}</tr>")
-    body_html = "".join(body_rows)
-    return (
-        "<table class='horaris-table'>"
-        f"<thead><tr>{header_html}</tr></thead>"
-        f"<tbody>{body_html}</tbody>"
-        "</table>"
-    )
+        parts.append("<tr>")
+        for column in columns:
+            parts.append("<td>")
+            parts.append(esc(str(row.get(column, ""))))
+            parts.append("</td>")
+        parts.append("</tr>")
+    parts.append("</tbody></table>")
+    return "".join(parts)
+
+
+def write_rows_csv(stream: IO[bytes], rows: list[dict[str, str]], columns: list[str]) -> None:
+    wrapper = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    writer = csv.writer(wrapper)
+    writer.writerow(columns)
+    writer.writerows([row.get(column, "") for column in columns] for row in rows)
+    wrapper.flush()
+    # Leave the underlying stream open for the caller.
+    wrapper.detach()
 
 
 def rows_to_csv(rows: list[dict[str, str]], columns: list[str]) -> bytes:
-    buffer = io.StringIO()
-    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
-    writer.writeheader()
-    for row in rows:
-        writer.writerow(row)
-    return buffer.getvalue().encode("utf-8")
+    buffer = io.BytesIO()
+    write_rows_csv(buffer, rows, columns)
+    return buffer.getvalue()
 
 
-def stringio_from_bytes(data: bytes, *, name: str) -> io.StringIO:
-    text = data.decode("utf-8-sig")
-    buffer = io.StringIO(text)
+def named_bytes_stream(data: bytes, *, name: str) -> io.BytesIO:
+    # The data loader decodes binary streams itself; the name labels its errors.
+    buffer = io.BytesIO(data)
     setattr(buffer, "name", name)
     return buffer
 
 
+# The cached loaders are keyed on the dataset digest; the leading underscore
+# keeps Streamlit from hashing the raw bytes again on every call.
+@st.cache_data(show_spinner=False)
+def load_students_cached(digest: str, _data: bytes) -> dict[str, Student]:
+    return {
+        student.identifier: student
+        for student in data_loader.load_students(named_bytes_stream(_data, name="alumnes.csv"))
+    }
+
+
+@st.cache_data(show_spinner=False)
+def load_adults_cached(digest: str, _data: bytes) -> dict[str, Adult]:
+    return {
+        adult.identifier: adult
+        for adult in data_loader.load_adults(named_bytes_stream(_data, name="adults.csv"))
+    }
+
+
+@st.cache_data(show_spinner=False)
+def load_workshops_cached(digest: str, _data: bytes) -> list[Workshop]:
+    return data_loader.load_workshops(
+        named_bytes_stream(_data, name="tallers.csv"),
+        valid_timeslots=DEFAULT_TIMESLOT_SET,
+    )
+
+
 def compute_signature(*datasets: bytes) -> str:
-    hasher = hashlib.sha256()
-    for data in datasets:
-        hasher.update(data)
-    return hasher.hexdigest()
+    return hashlib.blake2b(b"".join(datasets), digest_size=16).hexdigest()
+
+
+def cached_view(name: str, key: tuple, build: Callable[[], T]) -> T:
+    cache: dict[str, tuple[tuple, object]] = st.session_state.setdefault("view_cache", {})
+    entry = cache.get(name)
+    if entry is not None and entry[0] == key:
+        return entry[1]  # type: ignore[return-value]
+    value = build()
+    cache[name] = (key, value)
+    return value
+
+
+@lru_cache(maxsize=1024)
+def escape_text(text: str) -> str:
+    # Names, spaces and workshop titles repeat across the cells of a render.
+    return escape(text)
+
+
+def student_label(student: Student) -> str:
+    return f"{student.name} ({student.stage.capitalize()})" if student.stage else student.name
 
 
 def stage_to_class(stage: str | None) -> str:
+    # The data loader already strips and lowercases stages.
     if not stage:
         return "stage-altres"
-    slug = stage.lower().strip().replace(" ", "-")
-    return STAGE_CLASS_MAP.get(slug, "stage-altres")
+    return STAGE_CLASS_MAP.get(stage.replace(" ", "-"), "stage-altres")
+
+
+@lru_cache(maxsize=4096)
+def student_chip_html(student: Student) -> str:
+    # Students are frozen, so the chip markup can be reused across cells.
+    return (
+        f"<span class='student-chip {stage_to_class(student.stage)}'>"
+        f"{escape_text(student.name)}</span>"
+    )
 
 
 def sort_timeslots(timeslots: set[str]) -> list[str]:
-    order = {timeslot: index for index, timeslot in enumerate(DEFAULT_TIMESLOTS)}
-    return sorted(timeslots, key=lambda slot: (order.get(slot, len(order)), slot))
+    known = [timeslot for timeslot in DEFAULT_TIMESLOTS if timeslot in timeslots]
+    if len(known) == len(timeslots):
+        return known
+    return known + sorted(timeslots.difference(DEFAULT_TIMESLOT_SET))
 
 
-def derive_space_order(schedule: Schedule, timeslot_order: list[str]) -> list[str]:
-    ordered: list[str] = []
+def derive_space_order(
+    schedule: Schedule,
+    timeslot_order: list[str],
+    assignments_by_slot: Mapping[str, Mapping[str, Assignment]] | None = None,
+) -> list[str]:
+    # A dict doubles as an insertion-ordered set.
+    ordered: dict[str, None] = {}
     for timeslot in timeslot_order:
-        assignments = schedule.assignments_for_timeslot(timeslot)
+        if assignments_by_slot is None:
+            assignments = schedule.assignments_for_timeslot(timeslot)
+        else:
+            assignments = assignments_by_slot[timeslot]
         for assignment in assignments.values():
-            space = assignment.workshop.space
-            if space not in ordered:
-                ordered.append(space)
+            ordered.setdefault(assignment.workshop.space)
     for workshop in schedule.workshops.values():
-        if workshop.space not in ordered:
-            ordered.append(workshop.space)
-    return ordered
+        ordered.setdefault(workshop.space)
+    return list(ordered)
 
 
 def render_assignment_html(assignment, *, students: dict[str, Student], adults: dict[str, Adult]) -> str:
     workshop = assignment.workshop
-    parts = [f"<div class='workshop-title'>{escape(workshop.name)}</div>"]
+    parts = ["<div class='cell-wrapper'><div class='workshop-title'>", escape_text(workshop.name), "</div>"]
     if workshop.notes:
-        parts.append(f"<div class='workshop-notes'>{escape(workshop.notes)}</div>")
-
-    adult_names = [escape(adults[a_id].name) for a_id in sorted(assignment.adults) if a_id in adults]
-    if adult_names:
-        parts.append(
-            "<div class='adult-list'><span class='label'>Adults:</span> "
-            + ", ".join(adult_names)
-            + "</div>"
-        )
-
-    if assignment.students:
-        chips = []
-        for student_id in sorted(assignment.students):
-            student = students.get(student_id)
-            if student is None:
-                continue
-            css_class = stage_to_class(student.stage)
-            chips.append(f"<span class='student-chip {css_class}'>{escape(student.name)}</span>")
-        if chips:
-            parts.append(
-                "<div class='student-list'><span class='label'>Alumnes:</span> "
-                + "".join(chips)
-                + "</div>"
-            )
-
-    return f"<div class='cell-wrapper'>{''.join(parts)}</div>"
+        parts.append("<div class='workshop-notes'>")
+        parts.append(escape_text(workshop.notes))
+        parts.append("</div>")
+
+    adult_ids = [a_id for a_id in assignment.adult_order if a_id in adults]
+    if adult_ids:
+        parts.append("<div class='adult-list'><span class='label'>Adults:</span> ")
+        for index, a_id in enumerate(adult_ids):
+            if index:
+                parts.append(", ")
+            parts.append(escape_text(adults[a_id].name))
+        parts.append("</div>")
+
+    chip_students = [student for student in map(students.get, assignment.student_order) if student is not None]
+    if chip_students:
+        parts.append("<div class='student-list'><span class='label'>Alumnes:</span> ")
+        parts.extend(map(student_chip_html, chip_students))
+        parts.append("</div>")
+
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def index_assignments_by_space(
+    schedule: Schedule,
+    timeslots: list[str],
+    assignments_by_slot: Mapping[str, Mapping[str, Assignment]] | None = None,
+) -> dict[tuple[str, str], Assignment]:
+    # The first workshop found for a space wins, as the grid shows one cell per space.
+    index: dict[tuple[str, str], Assignment] = {}
+    for timeslot in timeslots:
+        if assignments_by_slot is None:
+            assignments = schedule.assignments_for_timeslot(timeslot)
+        else:
+            assignments = assignments_by_slot[timeslot]
+        for assignment in assignments.values():
+            index.setdefault((timeslot, assignment.workshop.space), assignment)
+    return index
 
 
 def build_schedule_grid_html(
@@ -146,37 +225,37 @@ def build_schedule_grid_html(
     adults: dict[str, Adult],
     timeslots: list[str],
     spaces: list[str],
+    slot_space_index: Mapping[tuple[str, str], Assignment] | None = None,
 ) -> str:
-    header_cells = "".join(f"<th class='space-header'>{escape(space)}</th>" for space in spaces)
-    body_rows: list[str] = []
+    parts = ["<table class='schedule-grid'><thead><tr><th class='timeslot-header'>Franja</th>"]
+    parts.extend(f"<th class='space-header'>{escape_text(space)}</th>" for space in spaces)
+    parts.append("</tr></thead><tbody>")
+
+    if slot_space_index is None:
+        slot_space_index = index_assignments_by_space(schedule, timeslots)
 
     for timeslot in timeslots:
-        assignments = schedule.assignments_for_timeslot(timeslot)
-        row_cells: list[str] = []
+        parts.append("<tr><th class='timeslot-cell'>")
+        parts.append(escape_text(timeslot))
+        parts.append("</th>")
         for space in spaces:
-            assignment = next(
-                (item for item in assignments.values() if item.workshop.space == space),
-                None,
-            )
+            assignment = slot_space_index.get((timeslot, space))
             if assignment is None:
-                row_cells.append("<td class='schedule-cell empty'></td>")
+                parts.append("<td class='schedule-cell empty'></td>")
             else:
-                content = render_assignment_html(assignment, students=students, adults=adults)
-                row_cells.append(f"<td class='schedule-cell'>{content}</td>")
-
-        body_rows.append(
-            "<tr>"
-            f"<th class='timeslot-cell'>{escape(timeslot)}</th>"
-            + "".join(row_cells)
-            + "</tr>"
-        )
+                parts.append("<td class='schedule-cell'>")
+                # The schedule clears this whenever the participants change.
+                html = assignment.cell_html
+                if html is None:
+                    html = assignment.cell_html = render_assignment_html(
+                        assignment, students=students, adults=adults
+                    )
+                parts.append(html)
+                parts.append("</td>")
+        parts.append("</tr>")
 
-    return (
-        "<table class='schedule-grid'>"
-        f"<thead><tr><th class='timeslot-header'>Franja</th>{header_cells}</tr></thead>"
-        f"<tbody>{''.join(body_rows)}</tbody>"
-        "</table>"
-    )
+    parts.append("</tbody></table>")
+    return "".join(parts)
 
 
 def build_schedule_grid_rows(
@@ -186,16 +265,17 @@ def build_schedule_grid_rows(
     adults: dict[str, Adult],
     timeslots: list[str],
     spaces: list[str],
+    slot_space_index: Mapping[tuple[str, str], Assignment] | None = None,
 ) -> list[dict[str, str]]:
+    if slot_space_index is None:
+        slot_space_index = index_assignments_by_space(schedule, timeslots)
+
+    students_get = students.get
     rows: list[dict[str, str]] = []
     for timeslot in timeslots:
-        assignments = schedule.assignments_for_timeslot(timeslot)
         row: dict[str, str] = {"Franja": timeslot}
         for space in spaces:
-            assignment = next(
-                (item for item in assignments.values() if item.workshop.space == space),
-                None,
-            )
+            assignment = slot_space_index.get((timeslot, space))
             if assignment is None:
                 row[space] = ""
                 continue
@@ -204,19 +284,14 @@ def build_schedule_grid_rows(
             if assignment.workshop.notes:
                 lines.append(f"Notes: {assignment.workshop.notes}")
 
-            adult_names = [adults[a_id].name for a_id in sorted(assignment.adults) if a_id in adults]
-            if adult_names:
-                lines.append("Adults: " + ", ".join(adult_names))
+            if assignment.adult_names_joined:
+                lines.append("Adults: " + assignment.adult_names_joined)
 
-            student_labels: list[str] = []
-            for student_id in sorted(assignment.students):
-                student = students.get(student_id)
-                if not student:
-                    continue
-                if student.stage:
-                    student_labels.append(f"{student.name} ({student.stage.capitalize()})")
-                else:
-                    student_labels.append(student.name)
+            student_labels = [
+                student_label(student)
+                for student in map(students_get, assignment.student_order)
+                if student is not None
+            ]
             if student_labels:
                 lines.append("Alumnes: " + ", ".join(student_labels))
 
@@ -227,16 +302,34 @@ def build_schedule_grid_rows(
     return rows
 
 
+@st.cache_resource(show_spinner=False)
+def load_grid_font() -> ImageFont.ImageFont | ImageFont.FreeTypeFont:
+    # Streamlit re-executes this script on every rerun, so a module-level
+    # constant would reload the font each time; share one per process instead.
+    return ImageFont.load_default()
+
+
 def schedule_grid_to_image_bytes(rows: list[dict[str, str]], columns: list[str]) -> bytes:
     header = columns
-    font = ImageFont.load_default()
+    font = load_grid_font()
     padding_x = 12
     padding_y = 10
     gutter = 2
 
-    measure_image = Image.new("RGB", (1, 1), "white")
+    measure_image = Image.new("L", (1, 1), "white")
     draw = ImageDraw.Draw(measure_image)
 
+    # Cells repeat (workshop names, empty slots), so each distinct text is
+    # measured once and reused for both the width and the height pass.
+    text_sizes: dict[str, tuple[int, int]] = {}
+
+    def measure(text: str) -> tuple[int, int]:
+        size = text_sizes.get(text)
+        if size is None:
+            bbox = draw.multiline_textbbox((0, 0), text, font=font, spacing=4)
+            size = text_sizes[text] = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+        return size
+
     column_widths: list[int] = []
     header_heights: list[int] = []
     for column in header:
@@ -248,28 +341,27 @@ def schedule_grid_to_image_bytes(rows: list[dict[str, str]], columns: list[str])
             text = row.get(column, "")
             if not text:
                 continue
-            bbox = draw.multiline_textbbox((0, 0), text, font=font, spacing=4)
-            text_width = bbox[2] - bbox[0]
-            max_width = max(max_width, text_width)
+            max_width = max(max_width, measure(text)[0])
         column_widths.append(max_width + 2 * padding_x)
 
-    baseline_height = draw.multiline_textbbox((0, 0), " ", font=font, spacing=4)
-    min_height = baseline_height[3] - baseline_height[1]
+    min_height = measure(" ")[1]
     row_heights: list[int] = []
     for row in rows:
         max_height = min_height
         for column in header:
             text = row.get(column, "")
-            bbox = draw.multiline_textbbox((0, 0), text or "", font=font, spacing=4)
-            text_height = bbox[3] - bbox[1]
-            max_height = max(max_height, text_height)
+            if not text:
+                continue
+            max_height = max(max_height, measure(text)[1])
         row_heights.append(max_height + 2 * padding_y)
 
     header_height = (max(header_heights) if header_heights else min_height) + 2 * padding_y
     width = sum(column_widths) + gutter * (len(header) + 1)
     height = header_height + sum(row_heights) + gutter * (len(row_heights) + 1)
 
-    image = Image.new("RGB", (width, height), "white")
+    # The grid is greyscale apart from a faint header tint, so a single 8-bit
+    # channel is enough; "L" keeps antialiased text, unlike palette mode.
+    image = Image.new("L", (width, height), "white")
     draw = ImageDraw.Draw(image)
 
     def draw_cell(x: int, y: int, w: int, h: int, text: str, *, bold: bool = False) -> None:
@@ -297,7 +389,8 @@ def schedule_grid_to_image_bytes(rows: list[dict[str, str]], columns: list[str])
         y += row_height + gutter
 
     output = io.BytesIO()
-    image.save(output, format="PNG")
+    # Flat colours compress well even at the fastest zlib level.
+    image.save(output, format="PNG", compress_level=1)
     return output.getvalue()
 
 
@@ -363,21 +456,158 @@ def _tabular_file_to_csv(uploaded_file) -> bytes:
     )
 
 
-def get_dataset_bytes(state_key: str, label: str, *, default_bytes: bytes) -> tuple[bytes, bool]:
+@st.cache_resource(show_spinner=False)
+def load_default_dataset(filename: str) -> bytes:
+    return (DATA_DIR / filename).read_bytes()
+
+
+@st.cache_resource(show_spinner=False)
+def default_dataset_digest(filename: str) -> str:
+    return compute_signature(load_default_dataset(filename))
+
+
+@st.cache_resource(show_spinner=False)
+def load_stylesheet() -> str:
+    return f"<style>\n{STYLESHEET_PATH.read_text(encoding='utf-8')}</style>"
+
+
+def inject_css() -> None:
+    # Streamlit drops any element that is not emitted again on a rerun, so the
+    # stylesheet has to be sent every time; the file is only read once.
+    st.markdown(load_stylesheet(), unsafe_allow_html=True)
+
+
+def format_student_option(student: Student) -> str:
+    bits: list[str] = [student.name]
+    if student.stage:
+        bits.append(student.stage.capitalize())
+    if student.group:
+        bits.append(student.group)
+    return " · ".join(bits)
+
+
+def format_adult_option(adult: Adult) -> str:
+    return f"{adult.name} · {adult.role}" if adult.role else adult.name
+
+
+@st.cache_data(show_spinner=False)
+def student_option_labels(digest: str, _students: dict[str, Student]) -> dict[str, str]:
+    return {student_id: format_student_option(student) for student_id, student in _students.items()}
+
+
+@st.cache_data(show_spinner=False)
+def adult_option_labels(digest: str, _adults: dict[str, Adult]) -> dict[str, str]:
+    return {adult_id: format_adult_option(adult) for adult_id, adult in _adults.items()}
+
+
+@fragment
+def assignment_panel(
+    schedule: Schedule,
+    *,
+    students: dict[str, Student],
+    adults: dict[str, Adult],
+    student_labels: dict[str, str],
+    adult_labels: dict[str, str],
+    selected_timeslot: Timeslot,
+    selected_workshop_id: str,
+) -> None:
+    # Runs as a fragment: editing the multiselects only reruns this panel.
+    # A successful assignment triggers a full rerun so that the summary and
+    # the weekly grid pick up the change.
+    selected_assignment = schedule.get_assignment(selected_timeslot, selected_workshop_id)
+    options_key = (schedule.version, selected_timeslot, selected_workshop_id)
+
+    feedback = st.session_state.pop("assignment_feedback", None)
+    if feedback:
+        st.success(feedback)
+
+    col_left, col_right = st.columns(2)
+
+    with col_left:
+        st.subheader("Assignació d'alumnes")
+
+        def build_student_options() -> list[str]:
+            assigned_students = schedule.assigned_students(selected_timeslot)
+            current_students = selected_assignment.students
+            return [
+                student_id
+                for student_id in students
+                if student_id not in assigned_students or student_id in current_students
+            ]
+
+        selected_students = st.multiselect(
+            "Selecciona alumnes",
+            options=cached_view("student_options", options_key, build_student_options),
+            format_func=student_labels.__getitem__,
+        )
+        if st.button("Afegeix alumnes", type="primary", use_container_width=True) and selected_students:
+            try:
+                schedule.assign_students(
+                    [students[student_id] for student_id in selected_students],
+                    timeslot=selected_timeslot,
+                    workshop_id=selected_workshop_id,
+                )
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                st.session_state["assignment_feedback"] = "Alumnes assignats correctament."
+                st.rerun()
+
+    with col_right:
+        st.subheader("Assignació d'adults")
+
+        def build_adult_options() -> list[str]:
+            assigned_adults = schedule.assigned_adults(selected_timeslot)
+            current_adults = selected_assignment.adults
+            return [
+                adult_id
+                for adult_id in adults
+                if adult_id not in assigned_adults or adult_id in current_adults
+            ]
+
+        selected_adults = st.multiselect(
+            "Selecciona adults",
+            options=cached_view("adult_options", options_key, build_adult_options),
+            format_func=adult_labels.__getitem__,
+        )
+        if st.button("Afegeix adults", use_container_width=True) and selected_adults:
+            try:
+                schedule.assign_adults(
+                    [adults[adult_id] for adult_id in selected_adults],
+                    timeslot=selected_timeslot,
+                    workshop_id=selected_workshop_id,
+                )
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                st.session_state["assignment_feedback"] = "Adults assignats correctament."
+                st.rerun()
+
+
+def get_dataset_bytes(
+    state_key: str, label: str, *, default_bytes: bytes, default_digest: str
+) -> tuple[bytes, str, bool]:
     uploaded = st.file_uploader(
         label,
         type=("csv", "xlsx", "xlsm", "xltx", "xltm"),
         key=f"{state_key}_uploader",
     )
-    if uploaded is not None:
+    # Only convert and hash an upload once; later reruns reuse the stored
+    # bytes and digest until the uploader hands over a different file.
+    if uploaded is not None and uploaded.file_id != st.session_state.get(f"{state_key}_file_id"):
         try:
-            st.session_state[state_key] = _tabular_file_to_csv(uploaded)
+            data = _tabular_file_to_csv(uploaded)
         except RuntimeError as exc:
             st.error(f"No s'ha pogut processar '{uploaded.name}': {exc}")
-            st.session_state.pop(state_key, None)
+            for key in (state_key, f"{state_key}_digest", f"{state_key}_file_id"):
+                st.session_state.pop(key, None)
+        else:
+            st.session_state[state_key] = data
+            st.session_state[f"{state_key}_digest"] = compute_signature(data)
+            st.session_state[f"{state_key}_file_id"] = uploaded.file_id
     if state_key in st.session_state:
-        return st.session_state[state_key], True
-    return default_bytes, False
+        return st.session_state[state_key], st.session_state[f"{state_key}_digest"], True
+    return default_bytes, default_digest, False
 
 
 def main() -> None:
@@ -388,119 +618,37 @@ def main() -> None:
 
     st.title("Planificador de Tallers de La Serra")
     st.caption("Assigna alumnes i adults a cada franja horària i espai.")
-    st.markdown(
-        """
-        <style>
-        .horaris-table {width: 100%; border-collapse: collapse;}
-        .horaris-table th, .horaris-table td {
-            border: 1px solid #d9d9d9;
-            padding: 0.5rem;
-            text-align: left;
-        }
-        .horaris-table thead tr {background-color: #f8f9fa;}
+    inject_css()
 
-        .schedule-grid {width: 100%; border-collapse: collapse; table-layout: fixed;}
-        .schedule-grid th, .schedule-grid td {
-            border: 1px solid #cdd0d5;
-            vertical-align: top;
-        }
-        .schedule-grid .timeslot-header {
-            width: 110px;
-            background-color: #eef2f7;
-            text-transform: uppercase;
-            letter-spacing: 0.04em;
-        }
-        .schedule-grid .space-header {
-            background-color: #f6f7fb;
-            font-size: 0.95rem;
-            text-transform: uppercase;
-        }
-        .schedule-grid .timeslot-cell {
-            background-color: #eef2f7;
-            font-weight: 600;
-            padding: 0.6rem;
-            text-align: center;
-        }
-        .schedule-grid .schedule-cell {
-            padding: 0.55rem;
-            background-color: #ffffff;
-        }
-        .schedule-grid .schedule-cell.empty {
-            background-color: #fafafa;
-        }
-        .cell-wrapper {
-            display: flex;
-            flex-direction: column;
-            gap: 0.35rem;
-            min-height: 110px;
-        }
-        .workshop-title {
-            font-weight: 700;
-            font-size: 0.95rem;
-            text-transform: uppercase;
-            color: #343a40;
-        }
-        .workshop-notes {
-            font-size: 0.75rem;
-            font-style: italic;
-            color: #6c757d;
-        }
-        .label {
-            font-weight: 600;
-            font-size: 0.72rem;
-            text-transform: uppercase;
-            letter-spacing: 0.04em;
-            margin-right: 0.35rem;
-            color: #495057;
-        }
-        .adult-list, .student-list {
-            font-size: 0.8rem;
-            line-height: 1.3;
-        }
-        .student-list {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 0.25rem;
-        }
-        .student-chip {
-            display: inline-block;
-            padding: 0.2rem 0.45rem;
-            border-radius: 4px;
-            font-weight: 600;
-            font-size: 0.75rem;
-        }
-        .student-chip.stage-mitjans {background-color: #fde2cf; color: #8b3d1a;}
-        .student-chip.stage-grans {background-color: #d6eaf8; color: #1f4e79;}
-        .student-chip.stage-altres {background-color: #e2e3e5; color: #343a40;}
-        .sidebar-hint {font-size: 0.75rem; color: #6c757d;}
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
-    default_students_bytes = (DATA_DIR / "students.csv").read_bytes()
-    default_adults_bytes = (DATA_DIR / "adults.csv").read_bytes()
-    default_workshops_bytes = (DATA_DIR / "workshops.csv").read_bytes()
+    default_students_bytes = load_default_dataset("students.csv")
+    default_adults_bytes = load_default_dataset("adults.csv")
+    default_workshops_bytes = load_default_dataset("workshops.csv")
+    default_students_digest = default_dataset_digest("students.csv")
+    default_adults_digest = default_dataset_digest("adults.csv")
+    default_workshops_digest = default_dataset_digest("workshops.csv")
 
     with st.sidebar:
         st.header("Dades")
         st.caption(
             "Carrega fitxers CSV o Excel amb el mateix format per utilitzar dades puntuals."
         )
-        students_bytes, students_custom = get_dataset_bytes(
+        students_bytes, students_digest, students_custom = get_dataset_bytes(
             "students_csv",
             "Alumnes (CSV o Excel)",
             default_bytes=default_students_bytes,
+            default_digest=default_students_digest,
         )
-        adults_bytes, adults_custom = get_dataset_bytes(
+        adults_bytes, adults_digest, adults_custom = get_dataset_bytes(
             "adults_csv",
             "Adults (CSV o Excel)",
             default_bytes=default_adults_bytes,
+            default_digest=default_adults_digest,
         )
-        workshops_bytes, workshops_custom = get_dataset_bytes(
+        workshops_bytes, workshops_digest, workshops_custom = get_dataset_bytes(
             "workshops_csv",
             "Tallers (CSV o Excel)",
             default_bytes=default_workshops_bytes,
+            default_digest=default_workshops_digest,
         )
 
         if students_custom or adults_custom or workshops_custom:
@@ -511,13 +659,27 @@ def main() -> None:
 
         reset_clicked = st.button("Restableix dades carregades", use_container_width=True)
 
+        st.header("Vista")
+        show_full_week = st.checkbox(
+            "Mostra vista completa de la setmana",
+            value=False,
+            key="show_full_week",
+        )
+
     if reset_clicked:
         for key in (
             "students_csv",
             "adults_csv",
             "workshops_csv",
+            "students_csv_digest",
+            "adults_csv_digest",
+            "workshops_csv_digest",
+            "students_csv_file_id",
+            "adults_csv_file_id",
+            "workshops_csv_file_id",
             "schedule_signature",
             "schedule",
+            "view_cache",
             "selected_workshop_id",
             "selected_timeslot",
             "students_csv_uploader",
@@ -528,58 +690,54 @@ def main() -> None:
         students_bytes = default_students_bytes
         adults_bytes = default_adults_bytes
         workshops_bytes = default_workshops_bytes
+        students_digest = default_students_digest
+        adults_digest = default_adults_digest
+        workshops_digest = default_workshops_digest
         students_custom = adults_custom = workshops_custom = False
 
     try:
-        students = {
-            student.identifier: student
-            for student in data_loader.load_students(
-                stringio_from_bytes(students_bytes, name="alumnes.csv")
-            )
-        }
+        students = load_students_cached(students_digest, students_bytes)
     except DataLoaderError as exc:
         st.error(f"Error carregant els alumnes: {exc}")
         st.stop()
 
     try:
-        adults = {
-            adult.identifier: adult
-            for adult in data_loader.load_adults(
-                stringio_from_bytes(adults_bytes, name="adults.csv")
-            )
-        }
+        adults = load_adults_cached(adults_digest, adults_bytes)
     except DataLoaderError as exc:
         st.error(f"Error carregant els adults: {exc}")
         st.stop()
 
-    signature = compute_signature(students_bytes, adults_bytes, workshops_bytes)
-    rebuild_schedule = (
-        "schedule" not in st.session_state
-        or st.session_state.get("schedule_signature") != signature
-    )
-
-    if rebuild_schedule:
+    signature = (students_digest, adults_digest, workshops_digest)
+    schedule: Schedule | None = st.session_state.get("schedule")
+    if schedule is None or st.session_state.get("schedule_signature") != signature:
         try:
-            workshops = data_loader.load_workshops(
-                stringio_from_bytes(workshops_bytes, name="tallers.csv"),
-                valid_timeslots=DEFAULT_TIMESLOTS,
-            )
+            workshops = load_workshops_cached(workshops_digest, workshops_bytes)
         except DataLoaderError as exc:
             st.error(f"Error carregant els tallers: {exc}")
             st.stop()
 
-        st.session_state.schedule = Schedule(workshops)
-        st.session_state.schedule_signature = signature
+        schedule = Schedule(workshops)
+        st.session_state["schedule"] = schedule
+        st.session_state["schedule_signature"] = signature
+        st.session_state.pop("view_cache", None)
         st.session_state.pop("selected_workshop_id", None)
         st.session_state.pop("selected_timeslot", None)
 
-    schedule: Schedule = st.session_state.schedule
-
-    timeslot_options = sort_timeslots({workshop.timeslot for workshop in schedule.workshops.values()})
+    # Workshops are fixed for the lifetime of a schedule, and the view cache is
+    # dropped whenever it is rebuilt, so these only depend on the schedule.
+    timeslot_options = cached_view(
+        "timeslot_options",
+        (),
+        lambda: sort_timeslots({workshop.timeslot for workshop in schedule.workshops.values()}),
+    )
     if not timeslot_options:
         st.info("No hi ha franges horàries disponibles als tallers carregats.")
         st.stop()
 
+    assignments_by_slot = {
+        timeslot: schedule.assignments_for_timeslot(timeslot) for timeslot in timeslot_options
+    }
+
     if st.session_state.get("selected_timeslot") not in timeslot_options:
         st.session_state.selected_timeslot = timeslot_options[0]
 
@@ -592,197 +750,174 @@ def main() -> None:
             key="selected_timeslot",
         )
 
-    workshops_in_slot = {
-        workshop_id: workshop
-        for workshop_id, workshop in schedule.workshops.items()
-        if workshop.timeslot == selected_timeslot
-    }
-    workshop_options = list(workshops_in_slot.keys())
-    if not workshop_options:
+    def build_workshop_labels() -> dict[str, str]:
+        workshops_by_id = schedule.workshops
+        return {
+            workshop_id: f"{workshops_by_id[workshop_id].space} — {workshops_by_id[workshop_id].name}"
+            for workshop_id in schedule.workshop_ids_for_timeslot(selected_timeslot)
+        }
+
+    workshop_labels = cached_view("workshop_labels", (selected_timeslot,), build_workshop_labels)
+    if not workshop_labels:
         st.info("No hi ha tallers disponibles en aquesta franja horària.")
         st.stop()
 
-    if st.session_state.get("selected_workshop_id") not in workshop_options:
+    workshop_options = cached_view(
+        "workshop_options", (selected_timeslot,), lambda: list(workshop_labels)
+    )
+    if st.session_state.get("selected_workshop_id") not in workshop_labels:
         st.session_state.selected_workshop_id = workshop_options[0]
 
     with filter_col_right:
         selected_workshop_id = st.selectbox(
             "Espai / Taller",
             options=workshop_options,
-            format_func=lambda key: f"{workshops_in_slot[key].space} — {workshops_in_slot[key].name}",
+            format_func=workshop_labels.get,
             key="selected_workshop_id",
         )
 
-    selected_assignment = schedule.assignments_for_timeslot(selected_timeslot).get(
-        selected_workshop_id
-    )
+    slot_assignments = assignments_by_slot[selected_timeslot]
+    selected_assignment = slot_assignments.get(selected_workshop_id)
     if selected_assignment is None:
         st.warning(
             "El taller seleccionat ja no està disponible en aquesta franja. S'ha restablert la selecció."
         )
         st.session_state.selected_workshop_id = workshop_options[0]
-        st.experimental_rerun()
+        st.rerun()
         return
 
-    def format_student_option(student: Student) -> str:
-        bits: list[str] = [student.name]
-        if student.stage:
-            bits.append(student.stage.capitalize())
-        if student.group:
-            bits.append(student.group)
-        return " · ".join(bits)
-
-    def format_adult_option(adult: Adult) -> str:
-        return f"{adult.name} · {adult.role}" if adult.role else adult.name
-
-    col_left, col_right = st.columns(2)
-
-    with col_left:
-        st.subheader("Assignació d'alumnes")
-        available_students = [
-            student
-            for student in students.values()
-            if not schedule.is_student_assigned(student.identifier, timeslot=selected_timeslot)
-            or student.identifier in selected_assignment.students
-        ]
-        student_names = {student.identifier: format_student_option(student) for student in available_students}
-        selected_students = st.multiselect(
-            "Selecciona alumnes",
-            options=list(student_names.keys()),
-            format_func=student_names.get,
-        )
-        if st.button("Afegeix alumnes", type="primary", use_container_width=True):
-            try:
-                for student_id in selected_students:
-                    schedule.assign_student(
-                        students[student_id],
-                        timeslot=selected_timeslot,
-                        workshop_id=selected_workshop_id,
-                    )
-                st.success("Alumnes assignats correctament.")
-            except ValueError as exc:
-                st.error(str(exc))
-
-    with col_right:
-        st.subheader("Assignació d'adults")
-        available_adults = [
-            adult
-            for adult in adults.values()
-            if not schedule.is_adult_assigned(adult.identifier, timeslot=selected_timeslot)
-            or adult.identifier in selected_assignment.adults
-        ]
-        adult_names = {adult.identifier: format_adult_option(adult) for adult in available_adults}
-        selected_adults = st.multiselect(
-            "Selecciona adults",
-            options=list(adult_names.keys()),
-            format_func=adult_names.get,
-        )
-        if st.button("Afegeix adults", use_container_width=True):
-            try:
-                for adult_id in selected_adults:
-                    schedule.assign_adult(
-                        adults[adult_id],
-                        timeslot=selected_timeslot,
-                        workshop_id=selected_workshop_id,
-                    )
-                st.success("Adults assignats correctament.")
-            except ValueError as exc:
-                st.error(str(exc))
+    assignment_panel(
+        schedule,
+        students=students,
+        adults=adults,
+        student_labels=student_option_labels(students_digest, students),
+        adult_labels=adult_option_labels(adults_digest, adults),
+        selected_timeslot=selected_timeslot,
+        selected_workshop_id=selected_workshop_id,
+    )
 
     st.divider()
     st.subheader("Resum de la franja")
-    current_assignments = schedule.assignments_for_timeslot(selected_timeslot)
-    summary_rows = []
-    for workshop_id, assignment in current_assignments.items():
-        summary_rows.append(
+
+    def build_summary_rows() -> list[dict[str, str]]:
+        students_get = students.get
+        return [
             {
-                "Espai": schedule.workshops[workshop_id].space,
-                "Taller": schedule.workshops[workshop_id].name,
+                "Espai": assignment.workshop.space,
+                "Taller": assignment.workshop.name,
                 "Alumnes": ", ".join(
-                    f"{students[s_id].name} ({students[s_id].stage.capitalize()})"
-                    if students[s_id].stage
-                    else students[s_id].name
-                    for s_id in sorted(assignment.students)
-                    if s_id in students
-                ),
-                "Adults": ", ".join(
-                    adults[a_id].name for a_id in sorted(assignment.adults) if a_id in adults
+                    student_label(student)
+                    for student in map(students_get, assignment.student_order)
+                    if student is not None
                 ),
+                "Adults": assignment.adult_names_joined,
             }
-        )
+            for assignment in slot_assignments.values()
+        ]
+
+    summary_rows = cached_view(
+        "summary_rows", (schedule.version, selected_timeslot), build_summary_rows
+    )
     summary_columns = ["Espai", "Taller", "Alumnes", "Adults"]
     st.markdown(
         build_table_html(summary_rows, summary_columns),
         unsafe_allow_html=True,
     )
 
-    st.divider()
-    st.subheader("Vista completa de la setmana")
-    space_order = derive_space_order(schedule, timeslot_options)
-    grid_html = build_schedule_grid_html(
-        schedule,
-        students=students,
-        adults=adults,
-        timeslots=timeslot_options,
-        spaces=space_order,
-    )
-    st.markdown(grid_html, unsafe_allow_html=True)
-
-    grid_rows = build_schedule_grid_rows(
-        schedule,
-        students=students,
-        adults=adults,
-        timeslots=timeslot_options,
-        spaces=space_order,
-    )
-    grid_columns = ["Franja", *space_order]
-    st.download_button(
-        "Descarrega en CSV",
-        data=rows_to_csv(grid_rows, grid_columns),
-        file_name="horaris_ls.csv",
-        mime="text/csv",
-    )
+    if show_full_week:
+        st.divider()
+        st.subheader("Vista completa de la setmana")
+        space_order = cached_view(
+            "space_order",
+            (),
+            lambda: derive_space_order(schedule, timeslot_options, assignments_by_slot),
+        )
+        slot_space_index = index_assignments_by_space(schedule, timeslot_options, assignments_by_slot)
+        grid_html = build_schedule_grid_html(
+            schedule,
+            students=students,
+            adults=adults,
+            timeslots=timeslot_options,
+            spaces=space_order,
+            slot_space_index=slot_space_index,
+        )
+        st.markdown(grid_html, unsafe_allow_html=True)
+
+        grid_rows = cached_view(
+            "grid_rows",
+            (schedule.version,),
+            lambda: build_schedule_grid_rows(
+                schedule,
+                students=students,
+                adults=adults,
+                timeslots=timeslot_options,
+                spaces=space_order,
+                slot_space_index=slot_space_index,
+            ),
+        )
+        grid_columns = ["Franja", *space_order]
+        st.download_button(
+            "Descarrega en CSV",
+            data=cached_view(
+                "grid_csv", (schedule.version,), lambda: rows_to_csv(grid_rows, grid_columns)
+            ),
+            file_name="horaris_ls.csv",
+            mime="text/csv",
+        )
 
-    st.download_button(
-        "Descarrega la vista com a imatge",
-        data=schedule_grid_to_image_bytes(grid_rows, grid_columns),
-        file_name="horaris_ls.png",
-        mime="image/png",
-    )
+        st.download_button(
+            "Descarrega la vista com a imatge",
+            data=cached_view(
+                "grid_png",
+                (schedule.version,),
+                lambda: schedule_grid_to_image_bytes(grid_rows, grid_columns),
+            ),
+            file_name="horaris_ls.png",
+            mime="image/png",
+        )
 
     st.divider()
     st.subheader("Horaris individuals")
 
-    def format_person_rows(
-        *,
-        person_id: str,
-        is_student: bool,
-    ) -> list[dict[str, str]]:
-        rows: list[dict[str, str]] = []
-        for timeslot in timeslot_options:
-            assignments = schedule.assignments_for_timeslot(timeslot)
+    def build_person_rows() -> tuple[dict[str, list[dict[str, str]]], dict[str, list[dict[str, str]]]]:
+        student_rows: dict[str, list[dict[str, str]]] = defaultdict(list)
+        adult_rows: dict[str, list[dict[str, str]]] = defaultdict(list)
+        for timeslot, assignments in assignments_by_slot.items():
             for assignment in assignments.values():
-                bucket = assignment.students if is_student else assignment.adults
-                if person_id not in bucket:
+                if not assignment.students and not assignment.adults:
                     continue
-                row = {
+                base = {
                     "Franja": timeslot,
                     "Espai": assignment.workshop.space,
                     "Taller": assignment.workshop.name,
                 }
                 if assignment.workshop.notes:
-                    row["Notes"] = assignment.workshop.notes
-                if is_student:
-                    row["Adults"] = ", ".join(
-                        adults[a_id].name for a_id in sorted(assignment.adults) if a_id in adults
-                    )
-                else:
-                    row["Alumnes"] = ", ".join(
-                        students[s_id].name for s_id in sorted(assignment.students) if s_id in students
-                    )
-                rows.append(row)
-        rows.sort(key=lambda row: row["Franja"])
-        return rows
+                    base["Notes"] = assignment.workshop.notes
+                # Rows are shared by everyone in the assignment; they are never mutated.
+                if assignment.students:
+                    student_row = {**base, "Adults": assignment.adult_names_joined}
+                    for student_id in assignment.students:
+                        student_rows[student_id].append(student_row)
+                if assignment.adults:
+                    adult_row = {**base, "Alumnes": assignment.student_names_joined}
+                    for adult_id in assignment.adults:
+                        adult_rows[adult_id].append(adult_row)
+        for rows_by_person in (student_rows, adult_rows):
+            for rows in rows_by_person.values():
+                rows.sort(key=lambda row: row["Franja"])
+        return dict(student_rows), dict(adult_rows)
+
+    student_rows_by_id, adult_rows_by_id = cached_view(
+        "person_rows", (schedule.version,), build_person_rows
+    )
+
+    def format_person_rows(
+        *,
+        person_id: str,
+        is_student: bool,
+    ) -> list[dict[str, str]]:
+        rows_by_id = student_rows_by_id if is_student else adult_rows_by_id
+        return rows_by_id.get(person_id, [])
 
     student_tab, adult_tab = st.tabs(["Alumnes", "Adults"])
 
@@ -836,24 +971,20 @@ def main() -> None:
                 if not rows:
                     continue
                 columns = ["Franja", "Espai", "Taller", "Adults", "Notes"]
-                archive.writestr(
-                    f"horari_{safe_filename(student.name)}.csv",
-                    rows_to_csv(rows, columns),
-                )
+                with archive.open(f"horari_{safe_filename(student.name)}.csv", "w") as entry:
+                    write_rows_csv(entry, rows, columns)
             for adult in sorted(adults.values(), key=lambda item: item.name):
                 rows = format_person_rows(person_id=adult.identifier, is_student=False)
                 if not rows:
                     continue
                 columns = ["Franja", "Espai", "Taller", "Alumnes", "Notes"]
-                archive.writestr(
-                    f"horari_{safe_filename(adult.name)}.csv",
-                    rows_to_csv(rows, columns),
-                )
+                with archive.open(f"horari_{safe_filename(adult.name)}.csv", "w") as entry:
+                    write_rows_csv(entry, rows, columns)
         return buffer.getvalue()
 
     st.download_button(
         "Descarrega tots els horaris (ZIP)",
-        data=build_bulk_archive(),
+        data=cached_view("bulk_archive", (schedule.version,), build_bulk_archive),
         file_name="horaris_individuals.zip",
         mime="application/zip",
     )
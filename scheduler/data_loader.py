@@ -3,8 +3,11 @@
 from __future__ import annotations
 
 import csv
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Iterable, Sequence, TextIO
+from typing import BinaryIO, Callable, Iterable, Iterator, Sequence, TextIO
 
 from .models import Adult, Student, Workshop, Timeslot
 
@@ -13,21 +16,36 @@ class DataLoaderError(RuntimeError):
     """Raised when a CSV file cannot be parsed correctly."""
 
 
-CsvSource = str | Path | TextIO
+CsvSource = str | Path | TextIO | BinaryIO
 
+# Read files in large chunks; the CSVs are scanned sequentially from start to end.
+CSV_BUFFER_SIZE = 256 * 1024
+
+# Required columns in documented order (for error messages) and as sets (for the check).
+_STUDENT_COLUMN_ORDER = ("id", "name", "stage")
+_ADULT_COLUMN_ORDER = ("id", "name")
+_WORKSHOP_COLUMN_ORDER = ("id", "name", "space", "timeslot", "capacity_students", "capacity_adults")
+_STUDENT_COLUMNS = frozenset(_STUDENT_COLUMN_ORDER)
+_ADULT_COLUMNS = frozenset(_ADULT_COLUMN_ORDER)
+_WORKSHOP_COLUMNS = frozenset(_WORKSHOP_COLUMN_ORDER)
 
-def _validate_headers(headers: Sequence[str], expected: Sequence[str], *, file_label: str) -> None:
-    missing = [name for name in expected if name not in headers]
-    if missing:
-        raise DataLoaderError(
-            f"El fitxer '{file_label}' no té les columnes requerides: {', '.join(missing)}"
-        )
 
+def _validate_headers(
+    headers: Sequence[str], expected: frozenset[str], order: Sequence[str], *, file_label: str
+) -> None:
+    if expected.issubset(headers):
+        return
+    present = set(headers)
+    missing = [name for name in order if name not in present]
+    raise DataLoaderError(
+        f"El fitxer '{file_label}' no té les columnes requerides: {', '.join(missing)}"
+    )
 
-def _prepare_reader(csv_source: CsvSource) -> tuple[csv.DictReader, Callable[[], None], str]:
+
+def _prepare_reader(csv_source: CsvSource) -> tuple[Iterator[list[str]], Callable[[], None], str]:
     if isinstance(csv_source, (str, Path)):
         path = Path(csv_source)
-        fh = path.open(newline="", encoding="utf-8")
+        fh = path.open(newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE)
         file_label = str(path)
 
         def closer() -> None:
@@ -39,29 +57,85 @@ def _prepare_reader(csv_source: CsvSource) -> tuple[csv.DictReader, Callable[[],
             fh.seek(0)
         file_label = getattr(fh, "name", "<arxiu carregat>")
 
-        def closer() -> None:  # pragma: no cover - simple passthrough
-            return None
+        if isinstance(fh, (io.RawIOBase, io.BufferedIOBase)):
+            # Binary streams are decoded on the fly; utf-8-sig drops a leading BOM.
+            fh = io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+            wrapper = fh
+
+            def closer() -> None:
+                # Hand the underlying stream back to the caller without closing it.
+                wrapper.detach()
 
-    reader = csv.DictReader(fh)
+        else:
+
+            def closer() -> None:  # pragma: no cover - simple passthrough
+                return None
+
+    reader = csv.reader(fh)
     return reader, closer, file_label
 
 
+def _column_indices(headers: Sequence[str]) -> dict[str, int]:
+    # Later duplicates win, as they did with csv.DictReader.
+    return {name: index for index, name in enumerate(headers)}
+
+
+def _data_rows(reader: Iterator[list[str]], width: int) -> Iterator[list[str]]:
+    """Yield non-blank rows padded with empty cells up to the header width."""
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row.extend([""] * (width - len(row)))
+        yield row
+
+
+def _parse_capacity(raw: str | None, *, audience: str, workshop_name: str | None) -> int | None:
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError as exc:
+        raise DataLoaderError(
+            f"La capacitat d'{audience} del taller '{workshop_name}' ha de ser numèrica"
+        ) from exc
+
+
 def load_students(csv_source: CsvSource) -> list[Student]:
     reader, closer, label = _prepare_reader(csv_source)
     try:
-        _validate_headers(reader.fieldnames or [], ["id", "name", "stage"], file_label=label)
+        headers = next(reader, [])
+        _validate_headers(headers, _STUDENT_COLUMNS, _STUDENT_COLUMN_ORDER, file_label=label)
+        columns = _column_indices(headers)
+        id_index, name_index, stage_index = columns["id"], columns["name"], columns["stage"]
+        group_index = columns.get("group")
         students = []
-        for row in reader:
-            if not row.get("id") or not row.get("name"):
+        # Raw stage cell -> normalised stage; rosters only use a few distinct values.
+        stages: dict[str, str | None] = {"": None}
+        for row in _data_rows(reader, len(headers)):
+            identifier, name = row[id_index], row[name_index]
+            if not identifier or not name:
+                continue
+            # Strip only once the cheap emptiness test passed; whitespace-only
+            # cells are skipped as well.
+            identifier, name = identifier.strip(), name.strip()
+            if not identifier or not name:
                 continue
-            stage_raw = (row.get("stage") or "").strip()
-            stage_value = stage_raw.lower() if stage_raw else None
+            stage_raw = row[stage_index]
+            if stage_raw in stages:
+                stage_value = stages[stage_raw]
+            else:
+                stage_clean = stage_raw.strip()
+                # Only a handful of distinct stages, spaces and roles exist; interning
+                # makes every record share one string object per value.
+                stage_value = stages[stage_raw] = sys.intern(stage_clean.lower()) if stage_clean else None
+            group = row[group_index] if group_index is not None else ""
             students.append(
                 Student(
-                    identifier=row["id"].strip(),
-                    name=row["name"].strip(),
+                    identifier=identifier,
+                    name=name,
                     stage=stage_value,
-                    group=row.get("group") or None,
+                    group=sys.intern(group) if group else None,
                 )
             )
     finally:
@@ -72,12 +146,29 @@ def load_students(csv_source: CsvSource) -> list[Student]:
 def load_adults(csv_source: CsvSource) -> list[Adult]:
     reader, closer, label = _prepare_reader(csv_source)
     try:
-        _validate_headers(reader.fieldnames or [], ["id", "name"], file_label=label)
-        adults = [
-            Adult(identifier=row["id"].strip(), name=row["name"].strip(), role=row.get("role") or None)
-            for row in reader
-            if row.get("id") and row.get("name")
-        ]
+        headers = next(reader, [])
+        _validate_headers(headers, _ADULT_COLUMNS, _ADULT_COLUMN_ORDER, file_label=label)
+        columns = _column_indices(headers)
+        id_index, name_index = columns["id"], columns["name"]
+        role_index = columns.get("role")
+        adults = []
+        for row in _data_rows(reader, len(headers)):
+            identifier, name = row[id_index], row[name_index]
+            if not identifier or not name:
+                continue
+            # Strip only once the cheap emptiness test passed; whitespace-only
+            # cells are skipped as well.
+            identifier, name = identifier.strip(), name.strip()
+            if not identifier or not name:
+                continue
+            role = row[role_index] if role_index is not None else ""
+            adults.append(
+                Adult(
+                    identifier=identifier,
+                    name=name,
+                    role=sys.intern(role) if role else None,
+                )
+            )
     finally:
         closer()
     return adults
@@ -85,44 +176,61 @@ def load_adults(csv_source: CsvSource) -> list[Adult]:
 
 def load_workshops(csv_source: CsvSource, *, valid_timeslots: Iterable[Timeslot]) -> list[Workshop]:
     reader, closer, label = _prepare_reader(csv_source)
-    valid_timeslots = set(valid_timeslots)
+    # Map every accepted label to a single shared string object so that all
+    # workshops (and the schedule dicts keyed on them) reuse the same key.
+    canonical_timeslots = {timeslot: timeslot for timeslot in valid_timeslots}
     try:
-        _validate_headers(
-            reader.fieldnames or [],
-            ["id", "name", "space", "timeslot", "capacity_students", "capacity_adults"],
-            file_label=label,
-        )
+        headers = next(reader, [])
+        _validate_headers(headers, _WORKSHOP_COLUMNS, _WORKSHOP_COLUMN_ORDER, file_label=label)
+        columns = _column_indices(headers)
+        id_index, name_index, space_index = columns["id"], columns["name"], columns["space"]
+        timeslot_index = columns["timeslot"]
+        capacity_students_index = columns["capacity_students"]
+        capacity_adults_index = columns["capacity_adults"]
+        notes_index = columns.get("notes")
         workshops: list[Workshop] = []
-        for row in reader:
-            raw_timeslot = row.get("timeslot", "").strip()
-            if raw_timeslot not in valid_timeslots:
+        for row in _data_rows(reader, len(headers)):
+            name = row[name_index]
+            raw_timeslot = row[timeslot_index].strip()
+            timeslot = canonical_timeslots.get(raw_timeslot)
+            if timeslot is None:
                 raise DataLoaderError(
-                    f"El taller '{row.get('name')}' té una franja horària invàlida: '{raw_timeslot}'"
+                    f"El taller '{name}' té una franja horària invàlida: '{raw_timeslot}'"
                 )
-            try:
-                capacity_students = int(row["capacity_students"]) if row.get("capacity_students") else None
-            except ValueError as exc:  # pragma: no cover - defensive programming
-                raise DataLoaderError(
-                    f"La capacitat d'alumnes del taller '{row.get('name')}' ha de ser numèrica"
-                ) from exc
-            try:
-                capacity_adults = int(row["capacity_adults"]) if row.get("capacity_adults") else None
-            except ValueError as exc:  # pragma: no cover - defensive programming
-                raise DataLoaderError(
-                    f"La capacitat d'adults del taller '{row.get('name')}' ha de ser numèrica"
-                ) from exc
+            capacity_students = _parse_capacity(
+                row[capacity_students_index], audience="alumnes", workshop_name=name
+            )
+            capacity_adults = _parse_capacity(
+                row[capacity_adults_index], audience="adults", workshop_name=name
+            )
+            notes = row[notes_index] if notes_index is not None else ""
 
             workshops.append(
                 Workshop(
-                    identifier=row["id"].strip(),
-                    name=row["name"].strip(),
-                    space=row["space"].strip(),
-                    timeslot=raw_timeslot,  # type: ignore[assignment]
+                    identifier=row[id_index].strip(),
+                    name=name.strip(),
+                    space=sys.intern(row[space_index].strip()),
+                    timeslot=timeslot,
                     capacity_students=capacity_students,
                     capacity_adults=capacity_adults,
-                    notes=row.get("notes") or None,
+                    notes=notes or None,
                 )
             )
     finally:
         closer()
     return workshops
+
+
+def load_all(
+    students_source: CsvSource,
+    adults_source: CsvSource,
+    workshops_source: CsvSource,
+    *,
+    valid_timeslots: Iterable[Timeslot],
+) -> tuple[list[Student], list[Adult], list[Workshop]]:
+    """Load the three datasets concurrently so reading one file overlaps parsing another."""
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        students = executor.submit(load_students, students_source)
+        adults = executor.submit(load_adults, adults_source)
+        workshops = executor.submit(load_workshops, workshops_source, valid_timeslots=valid_timeslots)
+        return students.result(), adults.result(), workshops.result()
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Literal
+from typing import Literal, get_args
 
 
 Timeslot = Literal[
@@ -10,8 +10,11 @@ Timeslot = Literal[
     "12:15-13:00",
 ]
 
+# Derived from the Literal so the ordered tuple and the type cannot drift apart.
+TIMESLOTS: tuple[Timeslot, ...] = get_args(Timeslot)
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Student:
     identifier: str
     name: str
@@ -19,14 +22,14 @@ class Student:
     group: str | None = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Adult:
     identifier: str
     name: str
     role: str | None = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Workshop:
     identifier: str
     name: str
@@ -2,18 +2,42 @@
 
 from __future__ import annotations
 
+import csv
+import warnings
+from bisect import insort
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import Dict, Iterable, Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import AbstractSet, Dict, Iterable, Iterator, Mapping, Sequence, TextIO
 
-from .models import Adult, Student, Timeslot, Workshop
+from .models import TIMESLOTS, Adult, Student, Timeslot, Workshop
 
 
-@dataclass
+@dataclass(slots=True)
 class Assignment:
     workshop: Workshop
-    students: set[str]
-    adults: set[str]
+    students: set[str] = field(default_factory=set)
+    adults: set[str] = field(default_factory=set)
+    # Same ids as the sets above, kept sorted on every mutation so renders
+    # never have to sort them again.
+    student_order: list[str] = field(default_factory=list)
+    adult_order: list[str] = field(default_factory=list)
+    student_names_joined: str = ""
+    adult_names_joined: str = ""
+    # Rendered grid cell, filled in by the front-end and cleared on every mutation.
+    cell_html: str | None = None
+    # Copied from the workshop so capacity checks avoid the extra hop.
+    capacity_students: int | None = field(init=False)
+    capacity_adults: int | None = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.capacity_students = self.workshop.capacity_students
+        self.capacity_adults = self.workshop.capacity_adults
+
+
+_NO_ASSIGNMENTS: Mapping[str, Assignment] = MappingProxyType({})
+
+EXPORT_COLUMNS: tuple[str, ...] = ("Franja", "Espai", "Taller", "Alumnes", "Adults", "Notes")
 
 
 class Schedule:
@@ -21,93 +45,185 @@ class Schedule:
 
     def __init__(self, workshops: Iterable[Workshop]):
         self._workshops_by_id: Dict[str, Workshop] = {workshop.identifier: workshop for workshop in workshops}
-        self._assignments: Dict[Timeslot, Dict[str, Assignment]] = defaultdict(dict)
+        # Known timeslots are preallocated in schedule order; any other label
+        # found in the workshops is appended after them.
+        self._assignments: Dict[Timeslot, Dict[str, Assignment]] = {timeslot: {} for timeslot in TIMESLOTS}
+        self._workshops_by_slot: Dict[Timeslot, list[str]] = {}
         for workshop in workshops:
-            self._assignments[workshop.timeslot][workshop.identifier] = Assignment(
-                workshop=workshop, students=set(), adults=set()
-            )
+            self._assignments.setdefault(workshop.timeslot, {})[workshop.identifier] = Assignment(workshop=workshop)
+        # Workshops never change, so the export order (timeslot, then space) is fixed up front.
+        self._row_order: list[tuple[Timeslot, list[Assignment]]] = [
+            (timeslot, sorted(slot.values(), key=lambda assignment: assignment.workshop.space))
+            for timeslot, slot in self._assignments.items()
+            if slot
+        ]
+        for workshop_id, workshop in self._workshops_by_id.items():
+            self._workshops_by_slot.setdefault(workshop.timeslot, []).append(workshop_id)
+        self._student_names: Dict[str, str] = {}
+        self._adult_names: Dict[str, str] = {}
+        # Per timeslot, person id -> id of the workshop they are assigned to.
+        self._student_index: Dict[Timeslot, Dict[str, str]] = defaultdict(dict)
+        self._adult_index: Dict[Timeslot, Dict[str, str]] = defaultdict(dict)
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """Counter bumped on every mutation, usable as a cache invalidation token."""
+        return self._version
 
     @property
     def workshops(self) -> Mapping[str, Workshop]:
         return self._workshops_by_id
 
+    def workshop_ids_for_timeslot(self, timeslot: Timeslot) -> Sequence[str]:
+        return self._workshops_by_slot.get(timeslot, ())
+
     def assignments_for_timeslot(self, timeslot: Timeslot) -> Mapping[str, Assignment]:
-        return self._assignments[timeslot]
+        return self._assignments.get(timeslot, _NO_ASSIGNMENTS)
 
     def get_assignment(self, timeslot: Timeslot, workshop_id: str) -> Assignment:
-        assignment = self._assignments[timeslot].get(workshop_id)
+        assignment = self.assignments_for_timeslot(timeslot).get(workshop_id)
         if assignment is None:
             raise KeyError(f"No s'ha trobat el taller amb id '{workshop_id}'.")
         return assignment
 
     def _check_capacity(self, assignment: Assignment, *, for_students: bool, quantity: int) -> None:
-        limit = assignment.workshop.capacity_students if for_students else assignment.workshop.capacity_adults
+        limit = assignment.capacity_students if for_students else assignment.capacity_adults
         if limit is not None and quantity > limit:
             audience = "alumnes" if for_students else "adults"
             raise ValueError(
                 f"El taller '{assignment.workshop.name}' ja ha arribat al límit de {audience} ({limit})."
             )
 
-    def _ensure_unique_timeslot(self, person_id: str, timeslot: Timeslot, *, kind: str) -> None:
-        assignments = self._assignments[timeslot]
-        for assignment in assignments.values():
-            bucket = assignment.students if kind == "student" else assignment.adults
-            if person_id in bucket:
-                raise ValueError(
-                    f"La persona amb id '{person_id}' ja està assignada en aquesta franja horària."
-                )
+    def _refresh_student_names(self, assignment: Assignment) -> None:
+        names = self._student_names
+        assignment.student_names_joined = ", ".join(names[identifier] for identifier in assignment.student_order)
+        assignment.cell_html = None
+
+    def _refresh_adult_names(self, assignment: Assignment) -> None:
+        names = self._adult_names
+        assignment.adult_names_joined = ", ".join(names[identifier] for identifier in assignment.adult_order)
+        assignment.cell_html = None
 
     def assign_student(self, student: Student, *, timeslot: Timeslot, workshop_id: str) -> None:
+        self.assign_students([student], timeslot=timeslot, workshop_id=workshop_id)
+
+    def assign_students(self, students: Iterable[Student], *, timeslot: Timeslot, workshop_id: str) -> None:
+        """Assign several students at once; nothing changes if any of them fails validation."""
         assignment = self.get_assignment(timeslot, workshop_id)
-        self._ensure_unique_timeslot(student.identifier, timeslot, kind="student")
-        new_count = len(assignment.students) + 1
+        batch = {student.identifier: student for student in students}
+        if not batch:
+            return
+        slot_index = self._student_index[timeslot]
+        for identifier in batch:
+            if identifier in slot_index:
+                raise ValueError(
+                    f"La persona amb id '{identifier}' ja està assignada en aquesta franja horària."
+                )
+        new_count = len(assignment.students) + len(batch)
         self._check_capacity(assignment, for_students=True, quantity=new_count)
-        assignment.students.add(student.identifier)
+        assignment.students.update(batch)
+        for identifier in batch:
+            insort(assignment.student_order, identifier)
+        self._student_names.update((identifier, student.name) for identifier, student in batch.items())
+        self._refresh_student_names(assignment)
+        slot_index.update(dict.fromkeys(batch, workshop_id))
+        self._version += 1
 
     def unassign_student(self, student: Student, *, timeslot: Timeslot, workshop_id: str) -> None:
-        assignment = self._assignments[timeslot].get(workshop_id)
-        if assignment:
+        assignment = self.assignments_for_timeslot(timeslot).get(workshop_id)
+        if assignment and student.identifier in assignment.students:
             assignment.students.discard(student.identifier)
+            assignment.student_order.remove(student.identifier)
+            self._refresh_student_names(assignment)
+            self._student_index[timeslot].pop(student.identifier, None)
+            self._version += 1
 
     def assign_adult(self, adult: Adult, *, timeslot: Timeslot, workshop_id: str) -> None:
+        self.assign_adults([adult], timeslot=timeslot, workshop_id=workshop_id)
+
+    def assign_adults(self, adults: Iterable[Adult], *, timeslot: Timeslot, workshop_id: str) -> None:
+        """Assign several adults at once; nothing changes if any of them fails validation."""
         assignment = self.get_assignment(timeslot, workshop_id)
-        self._ensure_unique_timeslot(adult.identifier, timeslot, kind="adult")
-        new_count = len(assignment.adults) + 1
+        batch = {adult.identifier: adult for adult in adults}
+        if not batch:
+            return
+        slot_index = self._adult_index[timeslot]
+        for identifier in batch:
+            if identifier in slot_index:
+                raise ValueError(
+                    f"La persona amb id '{identifier}' ja està assignada en aquesta franja horària."
+                )
+        new_count = len(assignment.adults) + len(batch)
         self._check_capacity(assignment, for_students=False, quantity=new_count)
-        assignment.adults.add(adult.identifier)
+        assignment.adults.update(batch)
+        for identifier in batch:
+            insort(assignment.adult_order, identifier)
+        self._adult_names.update((identifier, adult.name) for identifier, adult in batch.items())
+        self._refresh_adult_names(assignment)
+        slot_index.update(dict.fromkeys(batch, workshop_id))
+        self._version += 1
 
     def unassign_adult(self, adult: Adult, *, timeslot: Timeslot, workshop_id: str) -> None:
-        assignment = self._assignments[timeslot].get(workshop_id)
-        if assignment:
+        assignment = self.assignments_for_timeslot(timeslot).get(workshop_id)
+        if assignment and adult.identifier in assignment.adults:
             assignment.adults.discard(adult.identifier)
+            assignment.adult_order.remove(adult.identifier)
+            self._refresh_adult_names(assignment)
+            self._adult_index[timeslot].pop(adult.identifier, None)
+            self._version += 1
+
+    def assigned_students(self, timeslot: Timeslot) -> AbstractSet[str]:
+        slot_index = self._student_index.get(timeslot)
+        return slot_index.keys() if slot_index is not None else frozenset()
+
+    def assigned_adults(self, timeslot: Timeslot) -> AbstractSet[str]:
+        slot_index = self._adult_index.get(timeslot)
+        return slot_index.keys() if slot_index is not None else frozenset()
 
     def is_student_assigned(self, student_id: str, *, timeslot: Timeslot) -> bool:
-        return any(
-            student_id in assignment.students
-            for assignment in self._assignments[timeslot].values()
-        )
+        slot_index = self._student_index.get(timeslot)
+        return slot_index is not None and student_id in slot_index
 
     def is_adult_assigned(self, adult_id: str, *, timeslot: Timeslot) -> bool:
-        return any(
-            adult_id in assignment.adults
-            for assignment in self._assignments[timeslot].values()
-        )
-
-    def as_rows(self, *, students: Mapping[str, Student], adults: Mapping[str, Adult]) -> list[dict[str, str]]:
-        rows: list[dict[str, str]] = []
-        for timeslot, workshops in self._assignments.items():
-            for assignment in workshops.values():
-                rows.append(
-                    {
-                        "Franja": timeslot,
-                        "Espai": assignment.workshop.space,
-                        "Taller": assignment.workshop.name,
-                        "Alumnes": ", ".join(
-                            students[identifier].name for identifier in sorted(assignment.students)
-                        ),
-                        "Adults": ", ".join(adults[identifier].name for identifier in sorted(assignment.adults)),
-                        "Notes": assignment.workshop.notes or "",
-                    }
+        slot_index = self._adult_index.get(timeslot)
+        return slot_index is not None and adult_id in slot_index
+
+    def as_rows(
+        self,
+        *,
+        students: Mapping[str, Student] | None = None,
+        adults: Mapping[str, Adult] | None = None,
+    ) -> list[dict[str, str]]:
+        """Return one row per assignment, ordered by timeslot and then space.
+
+        Names come from the schedule itself, recorded when people are assigned;
+        the ``students`` and ``adults`` rosters are ignored and deprecated.
+        """
+        if students is not None or adults is not None:
+            warnings.warn(
+                "Schedule.as_rows() no longer uses the students/adults rosters; "
+                "names are taken from the assignments. Drop these arguments.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+        return [dict(zip(EXPORT_COLUMNS, values)) for values in self._export_values()]
+
+    def write_csv(self, stream: TextIO) -> None:
+        """Write the same table as :meth:`as_rows` to ``stream`` without building row dicts."""
+        writer = csv.writer(stream)
+        writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(self._export_values())
+
+    def _export_values(self) -> Iterator[tuple[str, ...]]:
+        # One tuple per assignment, in EXPORT_COLUMNS order.
+        for timeslot, assignments in self._row_order:
+            for assignment in assignments:
+                yield (
+                    timeslot,
+                    assignment.workshop.space,
+                    assignment.workshop.name,
+                    assignment.student_names_joined,
+                    assignment.adult_names_joined,
+                    assignment.workshop.notes or "",
                 )
-        rows.sort(key=lambda row: (row["Franja"], row["Espai"]))
-        return rows